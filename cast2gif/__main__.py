@@ -6,6 +6,8 @@ from pathlib import Path
 import sys
 from typing import Optional
 
+import PIL
+
 from . import __version_name__
 from .asciicast import AsciiCast
 from .fonts import FontCollection
@@ -14,38 +16,33 @@ from .recording import AutoTerminalSize, FixedTerminalSize, InheritedTerminalSiz
 
 class StatusLogger:
     def __init__(self, width: Optional[int] = None):
-        self.last_percent: int = -1
+        self.last_tenth: int = -1
         if width is None:
             width = max(os.get_terminal_size().columns, 30)
         self.width: int = width
 
     def log_frame(self, frame: int, num_frames: int):
-        percent_done = float(int(float(frame) / float(num_frames) * 1000.0)) / 10.0
-        if percent_done > self.last_percent:
-            self.clear()
-
-            sys.stderr.write("[")
-            bar_length = int((percent_done / 100.0) * (self.width - 2) + 0.5)
+        # progress is tracked in integer tenths of a percent, so most frames return here without any float math
+        tenth = frame * 1000 // num_frames if num_frames > 0 else 1000
+        if tenth > self.last_tenth:
+            percent_done = tenth / 10.0
+            bar_width = self.width - 2
+            bar_length = int((percent_done / 100.0) * bar_width + 0.5)
+            if percent_done >= 100:
+                bar = "=" * bar_width
+            elif bar_length > 0:
+                bar = f"{'=' * (bar_length - 1)}>".ljust(bar_width, "-")
+            else:
+                bar = "-" * bar_width
 
             percent_string = f"{percent_done:.1f}%"
+            percent_start = int((bar_width - len(percent_string)) / 2)
+            bar = f"{bar[:percent_start]}{percent_string}{bar[percent_start + len(percent_string):]}"
 
-            percent_start = int((self.width - 2 - len(percent_string)) / 2)
-
-            for i in range(self.width - 2):
-                if i == percent_start:
-                    sys.stderr.write(percent_string)
-                elif percent_start < i < percent_start + len(percent_string):
-                    continue
-                elif i < bar_length - 1 or percent_done >= 100:
-                    sys.stderr.write("=")
-                elif i == bar_length - 1:
-                    sys.stderr.write(">")
-                else:
-                    sys.stderr.write("-")
-
-            sys.stderr.write("]")
+            # clear the old bar and draw the new one in a single write
+            sys.stderr.write(f"\r{' ' * self.width}\r[{bar}]")
             sys.stderr.flush()
-            self.last_percent = percent_done
+            self.last_tenth = tenth
 
     def clear(self):
         sys.stderr.write(f"\r{' ' * self.width}\r")
@@ -125,6 +122,13 @@ def main(argv=None):
              "AsciiCast input, or set to zero if none is specified in the input; if provided, this option will "
              "override whatever is specified in the input",
     )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        help="The number of processes to render frames with, or zero to use one per CPU (default=1)",
+    )
     parser.add_argument(
         "--loop",
         type=int,
@@ -155,6 +159,10 @@ def main(argv=None):
 
     if args.version:
         print(__version_name__)
+        if ".post" in PIL.__version__:
+            print(f"Pillow-SIMD {PIL.__version__}")
+        else:
+            print(f"Pillow {PIL.__version__} (install Pillow-SIMD in its place for faster rendering)")
         sys.exit(0)
 
     if args.auto_size:
@@ -190,14 +198,15 @@ def main(argv=None):
             sys.stderr.write(f"\n\nWarning: `{' '.join(args.exec)}` exited with code {recording.return_value}\n\n")
     else:
         if args.ASCIICAST == "-":
-            input_stream = sys.stdin
+            input_stream = sys.stdin.buffer
         else:
-            input_stream = open(args.ASCIICAST, "rb")
+            input_stream = open(args.ASCIICAST, "rb", buffering=1 << 20)
         try:
             input_isatty = input_stream.isatty()
-            recording = AsciiCast.load(input_stream.read(), terminal_size=term_size)
+            # the lines are consumed straight from the stream rather than reading the whole file into memory first
+            recording = AsciiCast.load(input_stream, terminal_size=term_size)
         finally:
-            if input_stream != sys.stdin:
+            if input_stream is not sys.stdin.buffer:
                 input_stream.close()
 
     if args.output is None:
@@ -206,7 +215,7 @@ def main(argv=None):
         else:
             args.output = "%s.gif" % args.ASCIICAST
     if args.output == "-":
-        output_stream = sys.stdout
+        output_stream = sys.stdout.buffer
     else:
         if not args.force and os.path.exists(args.output):
             if not args.quiet:
@@ -215,7 +224,8 @@ def main(argv=None):
                     % args.output
                 )
             sys.exit(1)
-        output_stream = open(args.output, "wb")
+        # the encoder writes many small chunks, so they are collected into larger writes
+        output_stream = open(args.output, "wb", buffering=1 << 20)
     try:
         if not args.font:
             font_dir = Path(__file__).absolute().parent / "fonts"
@@ -244,7 +254,8 @@ def main(argv=None):
                 fps=args.fps,
                 idle_time_limit=args.idle_time_limit,
                 loop=args.loop,
-                frame_callback=frame_callback
+                frame_callback=frame_callback,
+                jobs=args.jobs
             )
 
         if not output_stream.isatty() and not args.quiet and sys.stderr.isatty():
@@ -253,7 +264,7 @@ def main(argv=None):
             sys.stderr.write("Saved AsciiCast to %s\n" % output_stream.name)
 
     finally:
-        if output_stream != sys.stdout:
+        if output_stream is not sys.stdout.buffer:
             output_stream.close()
 
 
@@ -1,9 +1,14 @@
+from itertools import islice
 import json
 from typing import Any, Dict, Iterable, Type, Union
 
 from .recording import AutoTerminalSize, C, InheritedTerminalSize, TerminalOutput, TerminalRecording, TerminalSize
 
 
+# The number of event lines that are decoded together
+EVENT_BATCH_SIZE = 1 << 12
+
+
 class AsciiCast(TerminalRecording):
     def __init__(self, terminal_size: TerminalSize = AutoTerminalSize()):
         super().__init__(terminal_size)
@@ -26,19 +31,29 @@ class AsciiCast(TerminalRecording):
         self._metadata = new_metadata
 
     @classmethod
-    def load(cls: Type[C], cast: Union[bytes, str, Iterable[str]],
+    def load(cls: Type[C], cast: Union[bytes, str, Iterable[bytes], Iterable[str]],
              terminal_size: TerminalSize = InheritedTerminalSize()) -> C:
         if isinstance(cast, str) or isinstance(cast, bytes):
+            # json.loads accepts bytes directly, so raw file contents are split and parsed without decoding them first
             cast = cast.splitlines()
 
         ascii_cast = cls(terminal_size=terminal_size)
 
-        for i, line in enumerate(cast):
-            if i == 0:
-                ascii_cast.metadata = json.loads(line)
+        lines = (line for line in cast if line.strip())
+        header = next(lines, None)
+        if header is None:
+            return ascii_cast
+        ascii_cast.metadata = json.loads(header)
+
+        # the events are read a batch of lines at a time, so a stream is never held in memory as a whole, and each
+        # batch is decoded with a single call, as the elements of one JSON array, rather than one call per line
+        for batch in iter(lambda: list(islice(lines, EVENT_BATCH_SIZE)), []):
+            if isinstance(header, bytes):
+                events = json.loads(b"[" + b",".join(batch) + b"]")
             else:
-                event_time, event_type, data = json.loads(line)
-                if event_type == "o":
-                    ascii_cast.events.append(TerminalOutput(data, time=event_time))
+                events = json.loads(f"[{','.join(batch)}]")
+            ascii_cast.events.extend(
+                TerminalOutput(data, time=event_time) for event_time, event_type, data in events if event_type == "o"
+            )
 
         return ascii_cast
@@ -1,6 +1,6 @@
 from functools import lru_cache
 from pathlib import Path
-from typing import List, Iterator, Optional, Sequence, Tuple, Union
+from typing import Dict, List, Iterator, Optional, Sequence, Set, Tuple, Union
 
 from PIL import ImageFont
 from PIL.ImageFont import FreeTypeFont
@@ -14,6 +14,9 @@ class FontCollection:
         self.size: int = size
         self._fonts: List[FreeTypeFont] = []
         self._ttfonts: List[TTFont] = []
+        self._paths: Set[str] = set()
+        self._codepoint_fonts: Optional[Dict[int, List[int]]] = None
+        self._resized: Dict[int, "FontCollection"] = {}
         for font in fonts:
             self.add(font)
 
@@ -27,15 +30,31 @@ class FontCollection:
         return self._fonts[index]
 
     def with_size(self, size: int) -> "FontCollection":
-        return FontCollection(*self._fonts, size=size)
+        """
+        Returns this collection at a different size
+
+        The character maps do not depend on the size, so the parsed font tables are shared with the resized collection
+        rather than loaded and parsed again, and the resized collection is kept for the next call with the same size.
+        """
+        resized = self._resized.get(size)
+        if resized is None:
+            resized = FontCollection(size=size)
+            resized._fonts = [ImageFont.truetype(font=font.path, size=size) for font in self._fonts]
+            resized._ttfonts = list(self._ttfonts)
+            resized._paths = set(self._paths)
+            resized._codepoint_fonts = self._fonts_by_codepoint()
+            self._resized[size] = resized
+        return resized
 
     @property
     def fonts(self) -> Sequence[FreeTypeFont]:
         return self._fonts
 
     def add(self, font: Union[str, Path, FreeTypeFont]):
+        self._codepoint_fonts = None
+        self._resized = {}
         if isinstance(font, FreeTypeFont):
-            if any(f.path == font.path for f in self._fonts):
+            if font.path in self._paths:
                 # we already added this font
                 return
             if font.size != self.size:
@@ -44,11 +63,12 @@ class FontCollection:
             self._ttfonts.append(TTFont(font.path))
         else:
             font = str(Path(font).expanduser().absolute())
-            if any(f.path == font for f in self._fonts):
+            if font in self._paths:
                 # we already added this font
                 return
             self._fonts.append(ImageFont.truetype(font=font, size=self.size))
             self._ttfonts.append(TTFont(font))
+        self._paths.add(self._fonts[-1].path)
 
     @lru_cache(maxsize=1024)
     def fonts_satisfying(self, text: str) -> OrderedMutableSet[FreeTypeFont]:
@@ -63,16 +83,36 @@ class FontCollection:
                     return fonts
             return fonts
         # len(text) == 1 here
-        fonts = OrderedMutableSet()
-        for font, ttfont in zip(self._fonts, self._ttfonts):
-            for table in ttfont["cmap"].tables:
-                if ord(text) in table.cmap.keys():
-                    fonts.add(font)
-        return fonts
+        return OrderedMutableSet(self._fonts[i] for i in self._fonts_by_codepoint().get(ord(text), ()))
+
+    def _fonts_by_codepoint(self) -> Dict[int, List[int]]:
+        """
+        Maps every codepoint that at least one font has a glyph for to the indices of those fonts, in ascending order
+
+        The map is built from the fonts' character maps the first time a glyph is looked up, since parsing them is
+        what dominates the cost either way, and is then shared by every lookup that follows and by every resized copy of
+        the collection.
+        """
+        if self._codepoint_fonts is None:
+            codepoint_fonts: Dict[int, List[int]] = {}
+            for i, ttfont in enumerate(self._ttfonts):
+                codepoints = set()
+                for table in ttfont["cmap"].tables:
+                    codepoints.update(table.cmap)
+                for codepoint in codepoints:
+                    codepoint_fonts.setdefault(codepoint, []).append(i)
+            self._codepoint_fonts = codepoint_fonts
+        return self._codepoint_fonts
 
     @lru_cache(maxsize=1024)
     def getsize(self, for_text: str) -> Tuple[int, int]:
-        return self.get_font(for_text).getsize(for_text)
+        font = self.get_font(for_text)
+        if not hasattr(font, "getbbox"):
+            # Pillow < 8.0
+            return font.getsize(for_text)
+        # FreeTypeFont.getsize is deprecated (and gone as of Pillow 10); it was the far corner of the bounding box
+        _, _, width, height = font.getbbox(for_text)
+        return width, height
 
     def get_font(self, for_text: str) -> Optional[FreeTypeFont]:
         try:
@@ -0,0 +1,75 @@
+from typing import BinaryIO, Iterable, Optional, Tuple
+
+from PIL import GifImagePlugin, Image, ImageChops
+
+
+class GifWriter:
+    """
+    Encodes palette images into an animated GIF one frame at a time
+
+    Every frame must use the same palette, which may only grow from one frame to the next: an index always refers to
+    the same color, and a frame that only uses colors from the first frame's palette is written without a color table.
+
+    Unlike `Image.save(save_all=True)`, which holds on to every frame until the whole animation has been encoded, a
+    frame is written out as soon as the next one arrives, so only two frames are ever kept in memory. Frames that are
+    identical to the previous one are merged into it, and every other frame is cropped to the region that changed.
+    """
+    def __init__(self, output_stream: BinaryIO, loop: int = 0):
+        self.output_stream: BinaryIO = output_stream
+        self.loop: int = loop
+        self._global_colors: int = 0
+        self._previous: Optional[Image.Image] = None
+        self._pending: Optional[Tuple[Image.Image, Tuple[int, int]]] = None
+        self._pending_duration: float = 0.0
+
+    def write(self, frame: Image.Image, duration: float):
+        """Appends a frame that is displayed for `duration` milliseconds"""
+        if self._previous is None:
+            header, _ = GifImagePlugin.getheader(frame, info={"loop": self.loop})
+            self.output_stream.write(b"".join(header))
+            self._global_colors = len(frame.getpalette()) // 3
+            self._pending = (frame, (0, 0))
+        else:
+            # the frames share a palette, so they can be compared index by index
+            bbox = ImageChops.difference(frame, self._previous).getbbox()
+            if bbox is None:
+                self._pending_duration += duration
+                return
+            self._flush()
+            self._pending = (frame.crop(bbox), bbox[:2])
+        self._pending_duration = duration
+        self._previous = frame
+
+    def _flush(self):
+        if self._pending is None:
+            return
+        im, offset = self._pending
+        # the palette only ever grows, so a frame needs a color table of its own only if it uses a color that was
+        # added after the first frame
+        used_colors = im.getcolors(256)
+        include_color_table = used_colors is None or max(i for _, i in used_colors) >= self._global_colors
+        if include_color_table and used_colors is not None:
+            # the frame carries its own color table anyway, so it only needs to hold the colors the frame uses
+            im = im.remap_palette(sorted(i for _, i in used_colors))
+        data = GifImagePlugin.getdata(
+            im, offset, duration=self._pending_duration, include_color_table=include_color_table
+        )
+        self.output_stream.write(b"".join(data))
+        # some Pillow versions collect the data into a list that is shared between calls
+        del data[:]
+        self._pending = None
+
+    def close(self):
+        self._flush()
+        if self._previous is not None:
+            self.output_stream.write(b";")
+        if hasattr(self.output_stream, "flush"):
+            self.output_stream.flush()
+
+
+def write_gif(output_stream: BinaryIO, frames: Iterable[Image.Image], loop: int = 0):
+    """Encodes the frames as an animated GIF, reading each frame's display time from its `info["duration"]`"""
+    writer = GifWriter(output_stream, loop=loop)
+    for frame in frames:
+        writer.write(frame, frame.info.get("duration", 0))
+    writer.close()
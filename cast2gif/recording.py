@@ -1,22 +1,34 @@
+from bisect import bisect_left
 import codecs
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+import itertools
 import math
 import os
 import pty
-from select import select
+import selectors
 import sys
 import termios
 import time as time_module
 import tty
-from typing import BinaryIO, Callable, Generic, Iterable, List, Optional, Type, TypeVar, Union
+from typing import (
+    BinaryIO, Callable, Deque, Dict, Generic, Iterable, Iterator, List, Optional, Tuple, Type, TypeVar, Union
+)
 
+from PIL import Image
 from PIL.ImageFont import FreeTypeFont
 
 from .fonts import FontCollection
+from .gif import write_gif
+from .screen import FramePalette, Screen, ScreenCell
 from .terminal import ANSITerminal, InfiniteWidthTerminal
 
 
 C = TypeVar("C")
 
+# The most consecutive frames a render worker is sent at once
+MAX_RENDER_CHUNK_SIZE = 16
+
 
 class TerminalEvent:
     def __init__(self, time: Optional[float] = None):
@@ -140,24 +152,22 @@ class TerminalRecording:
         return recording
 
     def calculate_optimal_fps(self, idle_time_limit: Optional[float] = None) -> float:
-        min_delta: Optional[float] = None
-        last: Optional[float] = None
-        for event in self.events:
-            if not isinstance(event, TerminalOutput):
-                continue
-            if last is None:
-                last = event.time
-            else:
-                delta = event.time - last
-                if idle_time_limit is not None and idle_time_limit > 0:
-                    delta = min(delta, idle_time_limit)
-                if delta >= 0.06:
-                    if min_delta is None:
-                        min_delta = delta
-                    else:
-                        min_delta = min(min_delta, delta)
-                    last = event.time
-        if min_delta is None or min_delta == 0.0:
+        times = [event.time for event in self.events if isinstance(event, TerminalOutput)]
+        if idle_time_limit is None or idle_time_limit <= 0:
+            idle_time_limit = math.inf
+        # the deltas are measured from the last event that was at least 0.06 seconds after its predecessor, so they
+        # cannot simply be taken pairwise
+        min_delta = math.inf
+        last = times[0] if times else 0.0
+        for time in itertools.islice(times, 1, None):
+            delta = time - last
+            if delta > idle_time_limit:
+                delta = idle_time_limit
+            if delta >= 0.06:
+                if delta < min_delta:
+                    min_delta = delta
+                last = time
+        if min_delta == math.inf or min_delta == 0.0:
             return 0
         else:
             return 1.0 / min_delta
@@ -181,27 +191,39 @@ class TerminalRecording:
             if not isinstance(event, TerminalOutput):
                 continue
             term.write(event.data)
-        term.render(font, include_scrollback=True).save(output_stream)
-
-    def render(
+        # the format is inferred from the file extension, falling back to PNG for streams like STDOUT that have none
+        extension = os.path.splitext(getattr(output_stream, "name", ""))[1].lower()
+        # registered_extensions() only loads the plugins if none are loaded yet, and importing the GIF plugin counts
+        Image.init()
+        image_format = Image.registered_extensions().get(extension, "PNG")
+        image = term.render(font, include_scrollback=True)
+        if image_format not in ("GIF", "PNG"):
+            # not every format can store palette images
+            image = image.convert("RGB")
+        image.save(output_stream, format=image_format)
+
+    def _frame_states(
             self,
-            output_stream: BinaryIO,
-            font: Union[FreeTypeFont, FontCollection],
-            fps: Optional[float] = None,
+            fps: float,
             idle_time_limit: int = 0,
-            loop: int = 0,
             frame_callback: Callable[[int, int], None] = lambda *_: None
-    ):
+    ) -> Iterator[Tuple[ANSITerminal, bool]]:
+        """
+        Plays the recording back on a terminal, yielding it once for every frame that is not dropped
+
+        Each terminal is accompanied by whether the frame might differ from the last; if not, the frame is identical.
+        """
         width = self.size.width
         height = self.size.height
         if width is None:
             width = 80
         if height is None:
             height = 24
-        images = []
-        if fps is None:
-            fps = math.ceil(self.calculate_optimal_fps(idle_time_limit=idle_time_limit))
         num_frames: int = math.ceil(self.events[-1].time) * fps
+        # the events are in chronological order, so the output written during each frame can be found by bisecting
+        # the event times rather than rescanning the remaining events on every frame
+        outputs = [event for event in self.events if isinstance(event, TerminalOutput)]
+        times = [event.time for event in outputs]
         offset = 0
         term = ANSITerminal(width, height)
         if idle_time_limit is None or idle_time_limit <= 0:
@@ -209,36 +231,189 @@ class TerminalRecording:
         else:
             max_idle_frames = int(idle_time_limit * fps + 0.5)
         idle_frames = 0
-        for frame in range(num_frames + 1):
+        rang_bell = False
+        frame = 0
+        while frame <= num_frames:
             frame_callback(frame, num_frames)
 
             frame_start = float(frame) / float(fps)
             frame_end = frame_start + 1.0 / float(fps)
-            is_idle = True
-            for event in self.events[offset:]:
-                if not isinstance(event, TerminalOutput):
-                    continue
-                elif event.time >= frame_end:
-                    break
-                offset += 1
-                is_idle = False
-                term.write(event.data)
+            end = bisect_left(times, frame_end, offset)
+            is_idle = end == offset
+            if not is_idle:
+                term.write("".join(event.data for event in outputs[offset:end]))
+            offset = end
             if is_idle:
                 idle_frames += 1
                 if idle_frames >= max_idle_frames:
-                    # drop this frame to stay within the idle_time_limit
+                    # drop this frame to stay within the idle_time_limit, and skip straight to (just before) the frame
+                    # with the next output, since every frame until then will be dropped, too
+                    if offset < len(times):
+                        frame = max(frame + 1, int(times[offset] * fps) - 1)
+                    else:
+                        frame_callback(num_frames, num_frames)
+                        break
                     continue
             else:
                 idle_frames = 0
 
-            images.append(term.render(font))
+            # if nothing was written and the bell did not just stop ringing, this frame is identical to the last
+            yield term, not is_idle or rang_bell
 
+            rang_bell = term.bell
             term.bell = False
+            frame += 1
+
+    def frames(
+            self,
+            font: Union[FreeTypeFont, FontCollection],
+            fps: float,
+            idle_time_limit: int = 0,
+            frame_callback: Callable[[int, int], None] = lambda *_: None,
+            jobs: int = 1
+    ) -> Iterator[Image.Image]:
+        """
+        Lazily renders the recording, yielding each distinct frame with its display time in `info["duration"]`
+
+        If `jobs` is greater than one, the terminal is played back first and the frames are then rendered by that many
+        worker processes; if it is zero or less, one worker is used per CPU.
+        """
+        if jobs <= 0:
+            jobs = os.cpu_count() or 1
+        if jobs > 1:
+            yield from self._render_in_parallel(font, fps, idle_time_limit, frame_callback, jobs)
+            return
+        frame_duration = 1000.0 / float(fps)
+        last_image: Optional[Image.Image] = None
+        last_duration = 0.0
+        for term, changed in self._frame_states(fps, idle_time_limit, frame_callback):
+            if changed or last_image is None:
+                image = term.render(font)
+                # the terminal returns the very same image if the screen did not actually change
+                if image is not last_image:
+                    if last_image is not None:
+                        last_image.info["duration"] = last_duration
+                        yield last_image
+                    last_image = image
+                    last_duration = frame_duration
+                    continue
+            # rather than emitting an identical frame, the last one is displayed for longer
+            last_duration += frame_duration
+        if last_image is not None:
+            last_image.info["duration"] = last_duration
+            yield last_image
+
+    def _render_in_parallel(
+            self,
+            font: Union[FreeTypeFont, FontCollection],
+            fps: float,
+            idle_time_limit: int,
+            frame_callback: Callable[[int, int], None],
+            jobs: int
+    ) -> Iterator[Image.Image]:
+        if not isinstance(font, FontCollection):
+            font = FontCollection(font, size=font.size)
+        frame_duration = 1000.0 / float(fps)
+        snapshots: List[ScreenSnapshot] = []
+        durations: List[float] = []
+        for term, changed in self._frame_states(fps, idle_time_limit):
+            if changed or not snapshots:
+                snapshot = ScreenSnapshot(term)
+                # output that left the screen as it was does not need a frame of its own
+                if not snapshots or snapshot != snapshots[-1]:
+                    snapshots.append(snapshot)
+                    durations.append(frame_duration)
+                    continue
+            durations[-1] += frame_duration
+        # the snapshots are sent to the workers in contiguous chunks, which lets each worker only redraw the cells that
+        # changed from one frame to the next within its chunk
+        chunksize = max(1, min(len(snapshots) // (jobs * 4), MAX_RENDER_CHUNK_SIZE))
+        chunks = (snapshots[start:start + chunksize] for start in range(0, len(snapshots), chunksize))
+        # every worker grows a palette of its own, so the same index can be a different shade in frames that were
+        # rendered by different workers; the frames are translated into a single palette before they are encoded
+        palette = FramePalette()
+        i = 0
+        with ProcessPoolExecutor(
+                max_workers=jobs, initializer=_init_render_worker, initargs=([f.path for f in font], font.size)
+        ) as executor:
+            # only a couple of chunks per worker are in flight at any time, so rendered frames do not pile up while
+            # the encoder falls behind the workers
+            pending: Deque["Future[List[Image.Image]]"] = deque(
+                executor.submit(_render_snapshots, chunk) for chunk in itertools.islice(chunks, jobs * 2)
+            )
+            while pending:
+                images = pending.popleft().result()
+                chunk = next(chunks, None)
+                if chunk is not None:
+                    pending.append(executor.submit(_render_snapshots, chunk))
+                for image in images:
+                    frame_callback(i, len(snapshots))
+                    image = palette.remap(image)
+                    image.info["duration"] = durations[i]
+                    i += 1
+                    yield image
+        frame_callback(len(snapshots), len(snapshots))
+
+    def render(
+            self,
+            output_stream: BinaryIO,
+            font: Union[FreeTypeFont, FontCollection],
+            fps: Optional[float] = None,
+            idle_time_limit: int = 0,
+            loop: int = 0,
+            frame_callback: Callable[[int, int], None] = lambda *_: None,
+            jobs: int = 1
+    ):
+        if fps is None:
+            fps = math.ceil(self.calculate_optimal_fps(idle_time_limit=idle_time_limit))
+        # frames are encoded as they are rendered rather than being collected first, and each carries its own duration
+        frames = self.frames(
+            font, fps=fps, idle_time_limit=idle_time_limit, frame_callback=frame_callback, jobs=jobs
+        )
+        write_gif(output_stream, frames, loop=loop)
+
+
+class ScreenSnapshot:
+    """The state of a screen that is needed to render it, captured so that it can be rendered in another process"""
+    def __init__(self, screen: Screen):
+        self.width: int = screen.width
+        self.height: int = screen.height
+        self.screen: List[List[Optional[ScreenCell]]] = [list(row) for row in screen.screen]
+        self.col: int = screen.col
+        self.row: int = screen.row
+        self.foreground: int = screen.foreground
+        self.background: int = screen.background
+        self.bell: bool = screen.bell
+        self.hide_cursor: bool = screen.hide_cursor
+
+    def __eq__(self, other):
+        # cells are shared between screens, so the rows compare by identity
+        return isinstance(other, ScreenSnapshot) and vars(self) == vars(other)
+
+
+_worker_font: Optional[FontCollection] = None
+_worker_screens: Dict[Tuple[int, int], Screen] = {}
 
-        images[0].save(output_stream, save_all=True,
-                       append_images=images[1:],
-                       duration=1000.0 / float(fps),
-                       loop=loop)
+
+def _init_render_worker(font_paths: List[str], font_size: int):
+    global _worker_font
+    _worker_font = FontCollection(*font_paths, size=font_size)
+
+
+def _render_snapshot(snapshot: ScreenSnapshot) -> Image.Image:
+    # each worker process renders with a screen of its own, so consecutive frames can reuse the previous render
+    screen = _worker_screens.get((snapshot.width, snapshot.height))
+    if screen is None:
+        screen = _worker_screens[(snapshot.width, snapshot.height)] = Screen(snapshot.width, snapshot.height)
+    screen.screen = snapshot.screen
+    screen.col, screen.row = snapshot.col, snapshot.row
+    screen.foreground, screen.background = snapshot.foreground, snapshot.background
+    screen.bell, screen.hide_cursor = snapshot.bell, snapshot.hide_cursor
+    return screen.render(_worker_font)
+
+
+def _render_snapshots(snapshots: List[ScreenSnapshot]) -> List[Image.Image]:
+    return [_render_snapshot(snapshot) for snapshot in snapshots]
 
 
 R = TypeVar("R", bound=TerminalRecording)
@@ -268,9 +443,16 @@ class TerminalRecorder(Generic[R]):
             mode = 0
         try:
 
-            fds = [master_fd, pty.STDIN_FILENO]
+            # the file descriptors are registered once, rather than being passed to the kernel again on every wait;
+            # poll() does not support terminal devices on macOS, though, so select() is still used there
+            if sys.platform != "darwin" and hasattr(selectors, "PollSelector"):
+                selector: selectors.BaseSelector = selectors.PollSelector()
+            else:
+                selector = selectors.SelectSelector()
+            selector.register(master_fd, selectors.EVENT_READ)
+            selector.register(pty.STDIN_FILENO, selectors.EVENT_READ)
             while True:
-                rfds, wfds, xfds = select(fds, [], [])
+                rfds = {key.fd for key, _ in selector.select()}
                 if master_fd in rfds:
                     data = self.read(master_fd)
                     if not data:  # Reached EOF.
@@ -280,11 +462,11 @@ class TerminalRecorder(Generic[R]):
                 if pty.STDIN_FILENO in rfds:
                     data = os.read(pty.STDIN_FILENO, 1024)
                     if not data:
-                        fds.remove(pty.STDIN_FILENO)
+                        selector.unregister(pty.STDIN_FILENO)
                     else:
-                        while data:
-                            n = os.write(master_fd, data)
-                            data = data[n:]
+                        written = 0
+                        while written < len(data):
+                            written += os.write(master_fd, memoryview(data)[written:])
 
         except OSError:
             pass
@@ -295,7 +477,9 @@ class TerminalRecorder(Generic[R]):
         os.close(master_fd)
         return os.waitpid(pid, 0)[1]
 
-    def read(self, fd: int, num_bytes: int = 255) -> bytes:
+    def read(self, fd: int, num_bytes: int = 1 << 16) -> bytes:
+        # a read returns whatever output is already waiting, so a large buffer only merges output that arrived at the
+        # same time into one event, rather than splitting it into many events with nearly the same timestamp
         data = os.read(fd, num_bytes)
         if not data:
             # close the decoder, which will throw an error if the stream was incomplete:
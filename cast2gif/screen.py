@@ -1,6 +1,7 @@
+from collections import deque
 from enum import IntEnum, IntFlag
 import itertools
-from typing import Iterable, List, Optional, Tuple, TypeVar, Union
+from typing import Deque, Dict, Iterable, List, Optional, Tuple, TypeVar, Union
 
 from PIL import Image, ImageDraw
 from PIL.ImageFont import FreeTypeFont
@@ -13,7 +14,11 @@ T = TypeVar("T")
 
 def constrain(n: T, n_min: T, n_max: T) -> T:
     """Constrain n to the range [n_min, n_max)"""
-    return min(max(n, n_min), n_max - 1)
+    if n < n_min:
+        return n_min
+    elif n >= n_max:
+        return n_max - 1
+    return n
 
 
 class CGAColor(IntEnum):
@@ -36,42 +41,42 @@ class CGAColor(IntEnum):
     WHITE = 15
 
 
+# RGB values of the CGA colors, indexed by CGAColor value
+CGA_RGB: Tuple[Tuple[int, int, int], ...] = (
+    (0, 0, 0),           # BLACK
+    (0, 0, 255),         # BLUE
+    (0, 255, 0),         # GREEN
+    (0, 255, 255),       # CYAN
+    (255, 0, 0),         # RED
+    (0xAA, 0x00, 0xAA),  # MAGENTA
+    (0xAA, 0x55, 0x00),  # BROWN
+    (0xAA, 0xAA, 0xAA),  # GRAY
+    (0x55, 0x55, 0x55),  # DARK_GRAY
+    (0x55, 0x55, 0xFF),  # LIGHT_BLUE
+    (0x55, 0xFF, 0x55),  # LIGHT_GREEN
+    (0x55, 0xFF, 0xFF),  # LIGHT_CYAN
+    (0xFF, 0x55, 0x55),  # LIGHT_RED
+    (0xFF, 0x55, 0xFF),  # LIGHT_MAGENTA
+    (0xFF, 0xFF, 0x55),  # YELLOW
+    (255, 255, 255),     # WHITE
+)
+
+
+# The number of distinct coverage levels an antialiased glyph is rendered with, including fully on and fully off
+ANTIALIAS_LEVELS = 8
+
+# The filter glyphs are downsampled with; Pillow 9.1 moved the filters into Image.Resampling and deprecated the old
+# module-level names, which older versions only have
+LANCZOS = getattr(Image, "Resampling", Image).LANCZOS
+
+# The most glyph masks and colored tiles a screen keeps cached at once; a recording with more distinct characters or
+# color combinations than this starts over with empty caches rather than growing without bound
+MAX_CACHED_GLYPHS = 1 << 12
+MAX_CACHED_TILES = 1 << 14
+
+
 def to_rgb(color: Union[int, CGAColor]) -> Tuple[int, int, int]:
-    value = color & 0b1111  # Strip out the high attribute bits
-    if value == int(CGAColor.BLACK):
-        return 0, 0, 0
-    elif value == int(CGAColor.BLUE):
-        return 0, 0, 255
-    elif value == int(CGAColor.GREEN):
-        return 0, 255, 0
-    elif value == int(CGAColor.CYAN):
-        return 0, 255, 255
-    elif value == int(CGAColor.RED):
-        return 255, 0, 0
-    elif value == int(CGAColor.MAGENTA):
-        return 0xAA, 0x00, 0xAA
-    elif value == int(CGAColor.BROWN):
-        return 0xAA, 0x55, 0x00
-    elif value == int(CGAColor.GRAY):
-        return (0xAA,) * 3
-    elif value == int(CGAColor.DARK_GRAY):
-        return (0x55,) * 3
-    elif value == int(CGAColor.LIGHT_BLUE):
-        return 0x55, 0x55, 0xFF
-    elif value == int(CGAColor.LIGHT_GREEN):
-        return 0x55, 0xFF, 0x55
-    elif value == int(CGAColor.LIGHT_CYAN):
-        return 0x55, 0xFF, 0xFF
-    elif value == int(CGAColor.LIGHT_RED):
-        return 0xFF, 0x55, 0x55
-    elif value == int(CGAColor.LIGHT_MAGENTA):
-        return 0xFF, 0x55, 0xFF
-    elif value == int(CGAColor.YELLOW):
-        return 0xFF, 0xFF, 0x55
-    elif value == int(CGAColor.WHITE):
-        return 255, 255, 255
-    else:
-        raise Exception(f"Unsupported Color: {color} (value = {value})")
+    return CGA_RGB[color & 0b1111]  # Strip out the high attribute bits
 
 
 class CGAAttribute(IntFlag):
@@ -80,13 +85,90 @@ class CGAAttribute(IntFlag):
     INTENSE = 8
 
 
+class FramePalette:
+    """
+    The color palette shared by every frame rendered from a screen
+
+    The palette starts out as the 16 CGA colors (so a CGAColor value is also its palette index) and grows as the
+    antialiased edges of glyphs require intermediate shades, up to the 256 colors a GIF frame can hold.
+    """
+    def __init__(self):
+        self.colors: List[Tuple[int, int, int]] = list(CGA_RGB)
+        self._indices: Dict[Tuple[int, int, int], int] = {rgb: i for i, rgb in enumerate(self.colors)}
+        self._data: Optional[bytes] = None
+
+    def index(self, rgb: Tuple[int, int, int]) -> int:
+        """Returns the palette index for the given color, adding it to the palette or approximating it if it is full"""
+        i = self._indices.get(rgb)
+        if i is None:
+            if len(self.colors) < 256:
+                i = len(self.colors)
+                self.colors.append(rgb)
+                self._data = None
+            else:
+                i = min(
+                    range(len(self.colors)),
+                    key=lambda j: sum((a - b) ** 2 for a, b in zip(rgb, self.colors[j]))
+                )
+            self._indices[rgb] = i
+        return i
+
+    def remap(self, im: Image.Image) -> Image.Image:
+        """Returns a copy of a palette image, rendered with some other palette, whose indices refer to this palette"""
+        colors = im.getpalette()
+        lut = [self.index(tuple(colors[i:i + 3])) for i in range(0, len(colors) - 2, 3)]
+        remapped = im.point(lut + [0] * (256 - len(lut)))
+        self.apply(remapped)
+        return remapped
+
+    def apply(self, im: Image.Image):
+        if self._data is None:
+            self._data = bytes(component for rgb in self.colors for component in rgb)
+        im.putpalette(self._data)
+
+
 class ScreenCell:
+    __slots__ = ("value", "foreground", "background", "attr")
+
     def __init__(self, value: str, foreground: CGAColor, background: CGAColor, attr: CGAAttribute):
         self.value: str = value
         self.foreground: CGAColor = foreground
         self.background: CGAColor = background
         self.attr: CGAAttribute = attr
 
+    @staticmethod
+    def styled(foreground: CGAColor, background: CGAColor, attr: CGAAttribute) -> "StyledCells":
+        """
+        Returns the shared cells with the given colors and attributes, indexed by their character
+
+        Cells are never modified once they are on the screen, so identical cells can be the same object; this saves
+        allocating a new cell for every character written and lets renders detect unchanged cells by identity.
+        """
+        key = (foreground, background, attr)
+        cells = _CELL_POOL.get(key)
+        if cells is None:
+            if len(_CELL_POOL) >= MAX_POOLED_STYLES:
+                _CELL_POOL.clear()
+            cells = _CELL_POOL[key] = StyledCells(foreground, background, attr)
+        return cells
+
+
+class StyledCells(Dict[str, ScreenCell]):
+    """A pool of cells that share the same colors and attributes, which creates each cell the first time it is used"""
+    def __init__(self, foreground: CGAColor, background: CGAColor, attr: CGAAttribute):
+        super().__init__()
+        self.foreground: CGAColor = foreground
+        self.background: CGAColor = background
+        self.attr: CGAAttribute = attr
+
+    def __missing__(self, value: str) -> ScreenCell:
+        cell = self[value] = ScreenCell(value, self.foreground, self.background, self.attr)
+        return cell
+
+
+MAX_POOLED_STYLES = 1 << 12
+_CELL_POOL: Dict[Tuple[int, int, int], StyledCells] = {}
+
 
 class ScreenPortion(IntEnum):
     CURSOR_TO_END_OF_SCREEN = 0
@@ -101,14 +183,27 @@ class Screen:
         self.width: int = width
         self.height: int = height
         self.scrollback: Optional[int] = scrollback
-        self.scroll_buffer: List[List[Optional[ScreenCell]]] = []
+        # the oldest rows fall off the front on their own once the scrollback is full
+        self.scroll_buffer: Deque[List[Optional[ScreenCell]]] = deque(maxlen=scrollback)
         self.screen: List[List[Optional[ScreenCell]]] = []
-        self.foreground: CGAColor = CGAColor.GRAY
-        self.background: CGAColor = CGAColor.BLACK
-        self.attr: CGAAttribute = CGAAttribute.PLAIN
+        # the current colors and attributes are kept as plain ints, since they are masked and combined for every
+        # SGR escape and bitwise operations on enum members are much slower
+        self.foreground: int = int(CGAColor.GRAY)
+        self.background: int = int(CGAColor.BLACK)
+        self.attr: int = int(CGAAttribute.PLAIN)
         self.bell = False
         self.hide_cursor = False
         self.tab_width: int = 8
+        self._last_render: Optional[
+            Tuple[tuple, Image.Image, List[List[Optional[ScreenCell]]], Optional[Tuple[int, int]], int]
+        ] = None
+        self._palette: FramePalette = FramePalette()
+        self._tiles: Dict[Tuple[str, int, int], Image.Image] = {}
+        self._tiles_key: Optional[tuple] = None
+        self._glyphs: Dict[str, Image.Image] = {}
+        self._mask: Optional[Image.Image] = None
+        self._last_styled_cells: Optional[StyledCells] = None
+        self._metrics: Optional[Tuple[tuple, Tuple[FontCollection, int, int, int]]] = None
         self.clear(2)
 
     def clear(self, screen_portion: Union[int, ScreenPortion] = ScreenPortion.CURSOR_TO_END_OF_SCREEN):
@@ -119,17 +214,25 @@ class Screen:
                the screen; and 2 clears the entire screen
         :return: returns nothing
         """
+        # The rows are blanked in place with slice assignments rather than reallocating the grid
         if screen_portion == 1:
             # Clear from the beginning of the screen to the cursor
-            self.screen[self.row] = [None] * (self.width - self.col + 1) + self.screen[self.row][self.col + 1:]
-            self.screen = [[None] * self.width for _ in range(self.row)] + self.screen[self.row:]
+            for row in self.screen[:self.row]:
+                row[:] = [None] * self.width
+            cleared = min(self.col + 1, self.width)
+            self.screen[self.row][:cleared] = [None] * cleared
         elif screen_portion == 2:
             # Clear the entire screen
-            self.screen = [[None] * self.width for _ in range(self.height)]
+            if len(self.screen) != self.height:
+                self.screen = [[None] * self.width for _ in range(self.height)]
+            else:
+                for row in self.screen:
+                    row[:] = [None] * self.width
         else:
             # Clear from the cursor to the end of the screen
-            self.screen[self.row] = self.screen[self.row][:self.col] + [None] * (self.width - self.col)
-            self.screen = self.screen[:self.row + 1] + [[None] * self.width for i in range(self.height - self.row - 1)]
+            self.screen[self.row][self.col:] = [None] * (self.width - self.col)
+            for row in self.screen[self.row + 1:]:
+                row[:] = [None] * self.width
 
     def erase_line(self, line_portion: int = 0):
         """
@@ -139,15 +242,18 @@ class Screen:
                line; and 2 clears the entire line
         :return: returns nothing
         """
+        # the row is blanked in place rather than rebuilt from slices
+        row = self.screen[self.row]
         if line_portion == 1:
             # Clear from the beginning of the line to the cursor
-            self.screen[self.row] = [None] * (self.width - self.col + 1) + self.screen[self.row][self.col + 1:]
+            cleared = min(self.col + 1, len(row))
+            row[:cleared] = [None] * cleared
         elif line_portion == 2:
             # Clear the entire line
-            self.screen[self.row] = [None] * self.width
+            row[:] = [None] * self.width
         else:
             # Clear from the cursor to the end of the line
-            self.screen[self.row] = self.screen[self.row][:self.col] + [None] * (self.width - self.col)
+            row[self.col:] = [None] * (self.width - self.col)
 
     def write(self, char: Optional[str], foreground: Optional[CGAColor] = None, background: Optional[CGAColor] = None,
               attr: Optional[CGAAttribute] = None):
@@ -163,11 +269,18 @@ class Screen:
         elif char == '\b':
             # backspace
             if self.col > 0:
-                self.screen[self.row] = self.screen[self.row][:self.col - 1] + self.screen[self.row][self.col:] + [None]
+                row = self.screen[self.row]
+                # every row is exactly as wide as the screen, but the cursor can be moved past its end
+                if self.col <= self.width:
+                    del row[self.col - 1]
+                    row.append(None)
                 self.col -= 1
-        elif ord(char) == 127:
+        elif char == '\x7f':
             # delete
-            self.screen[self.row] = self.screen[self.row][:self.col] + self.screen[self.row][self.col + 1:] + [None]
+            row = self.screen[self.row]
+            if self.col < self.width:
+                del row[self.col]
+                row.append(None)
         elif char == '\x07':
             self.bell = True
         else:
@@ -178,18 +291,52 @@ class Screen:
             if attr is None:
                 attr = self.attr
             if 0 <= self.row < self.height and 0 <= self.col < self.width:
-                self.screen[self.row][self.col] = ScreenCell(char, foreground, background, attr)
+                self.screen[self.row][self.col] = self._styled_cells(foreground, background, attr)[char]
             self.col += 1
+        self._wrap()
+
+    def write_text(self, text: str, foreground: Optional[CGAColor] = None, background: Optional[CGAColor] = None,
+                   attr: Optional[CGAAttribute] = None):
+        """Writes a run of printable characters, filling as much of each row as it can at once"""
+        if foreground is None:
+            foreground = self.foreground
+        if background is None:
+            background = self.background
+        if attr is None:
+            attr = self.attr
+        cells = self._styled_cells(foreground, background, attr)
+        while text:
+            if not (0 <= self.col < self.width and 0 <= self.row < self.height):
+                # the cursor was moved off of the screen, so fall back to writing one character at a time
+                for c in text:
+                    Screen.write(self, c, foreground=foreground, background=background, attr=attr)
+                return
+            n = min(len(text), self.width - self.col)
+            self.screen[self.row][self.col:self.col + n] = [cells[c] for c in text[:n]]
+            self.col += n
+            self._wrap()
+            text = text[n:]
+
+    def _styled_cells(self, foreground: CGAColor, background: CGAColor, attr: CGAAttribute) -> StyledCells:
+        cells = self._last_styled_cells
+        # the style rarely changes between writes, and checking that by identity is cheaper than hashing it
+        if cells is None or cells.foreground is not foreground or cells.background is not background \
+                or cells.attr is not attr:
+            cells = self._last_styled_cells = ScreenCell.styled(foreground, background, attr)
+        return cells
+
+    def _wrap(self):
+        """Moves the cursor to the next line if it ran off the end of this one, scrolling if necessary"""
         if self.col >= self.width:
             self.col = 0
             self.row += 1
         if self.row >= self.height:
             extra_rows = self.row - self.height + 1
             if extra_rows > 0 and (self.scrollback is None or self.scrollback > 0):
-                self.scroll_buffer += self.screen[:extra_rows]
-                if self.scrollback is not None:
-                    self.scroll_buffer = self.scroll_buffer[-self.scrollback:]
-            self.screen = self.screen[extra_rows:] + [[None] * self.width for _ in range(extra_rows)]
+                self.scroll_buffer.extend(self.screen[:extra_rows])
+            # scroll in place, which only shifts the row references rather than rebuilding the whole screen
+            del self.screen[:extra_rows]
+            self.screen.extend([None] * self.width for _ in range(min(extra_rows, self.height)))
             self.row = self.height - 1
 
     def move_up(self, rows: int = 1):
@@ -210,65 +357,206 @@ class Screen:
         if row is not None:
             self.row = row
 
-    def render(self, font: Union[FreeTypeFont, FontCollection], include_scrollback: bool = False,
-               antialias: bool = True, baseline_skip: Optional[int] = None) -> Image:
+    def _glyph_levels(self, c: str, font: FontCollection, scaled_size: Tuple[int, int],
+                      size: Tuple[int, int]) -> Image.Image:
+        """Rasterizes a character into a mask of its coverage, quantized to `ANTIALIAS_LEVELS` levels"""
+        levels = self._glyphs.get(c)
+        if levels is None:
+            if len(self._glyphs) >= MAX_CACHED_GLYPHS:
+                self._glyphs.clear()
+            mask = self._mask
+            if mask is None or mask.size != scaled_size:
+                mask = self._mask = Image.new("L", scaled_size)
+            else:
+                mask.paste(0, (0, 0) + scaled_size)
+            ImageDraw.Draw(mask).text((0, 0), c, fill=255, font=font.get_font(c))
+            if scaled_size != size:
+                mask = mask.resize(size, resample=LANCZOS)
+            levels = self._glyphs[c] = mask.point([(v * (ANTIALIAS_LEVELS - 1) + 127) // 255 for v in range(256)])
+        return levels
+
+    def _render_tile(self, c: str, foreground: int, background: int, font: FontCollection, scaled_size: Tuple[int, int],
+                     size: Tuple[int, int]) -> Image.Image:
+        """Colors a single cell into a palette image of the given size"""
+        # each character is only rasterized once; every color combination it appears in reuses its coverage mask
+        levels = self._glyph_levels(c, font, scaled_size, size)
+        fg, bg = to_rgb(foreground), to_rgb(background)
+        shades = [
+            self._palette.index(tuple(b + (f - b) * level // (ANTIALIAS_LEVELS - 1) for f, b in zip(fg, bg)))
+            for level in range(ANTIALIAS_LEVELS)
+        ]
+        indices = levels.point(shades + [0] * (256 - ANTIALIAS_LEVELS))
+        return Image.frombytes("P", size, indices.tobytes())
+
+    def _font_metrics(
+            self, font: Union[FreeTypeFont, FontCollection], antialias: bool, baseline_skip: Optional[int]
+    ) -> Tuple[FontCollection, int, int, int]:
+        """
+        Returns the font to rasterize glyphs with, along with its scale factor and the scaled cell width and height
+
+        These are the same from one frame to the next, so they are only computed again when the font or the rendering
+        options change.
+        """
+        key = (font, font.size, antialias, baseline_skip)
+        cached = self._metrics
+        if cached is not None and cached[0] == key:
+            return cached[1]
         if not isinstance(font, FontCollection):
-            font = FontCollection(font, size=font.size)
+            scaled_font = FontCollection(font, size=font.size)
         elif len(font) <= 0:
             raise ValueError("The FontCollection must contain at least one font!")
+        else:
+            scaled_font = font
         if antialias:
             scale_factor = 4
-            font = font.with_size(font.size * scale_factor)
+            scaled_font = scaled_font.with_size(scaled_font.size * scale_factor)
         else:
             scale_factor = 1
-        font_width = font.getsize('X')[0]
+        scaled_width = scaled_font.getsize('X')[0]
         if baseline_skip is None:
-            baseline_skip = font.size // 4
+            baseline_skip = scaled_font.size // 4
         else:
             baseline_skip *= scale_factor
-        font_height = font.size + baseline_skip
+        scaled_height = scaled_font.size + baseline_skip
+        metrics = (scaled_font, scale_factor, scaled_width, scaled_height)
+        self._metrics = (key, metrics)
+        return metrics
+
+    def render(self, font: Union[FreeTypeFont, FontCollection], include_scrollback: bool = False,
+               antialias: bool = True, baseline_skip: Optional[int] = None) -> Image:
+        font, scale_factor, scaled_width, scaled_height = self._font_metrics(font, antialias, baseline_skip)
+        # glyphs are rasterized at the scaled size and each tile is then downsampled on its own, so frames are only
+        # ever assembled at the output size and only use colors that are in the palette
+        font_width = max(round(scaled_width / scale_factor), 1)
+        font_height = max(round(scaled_height / scale_factor), 1)
         image_width = self.width * font_width
         image_height = self.height * font_height
         if include_scrollback:
             image_height += len(self.scroll_buffer) * font_height
-        im = Image.new("RGB", (image_width + 2 * font_width, image_height + 2 * font_height))
-        draw = ImageDraw.Draw(im)
         if self.bell:
-            fill_color = self.foreground
+            fill_color = self.foreground & 0b1111
         else:
-            fill_color = self.background
-        draw.rectangle(
-            ((0, 0), (image_width + 2 * font_width, image_height + 2 * font_height)),
-            fill=to_rgb(fill_color)
-        )
-        cursor_drawn = False
+            fill_color = self.background & 0b1111
         if include_scrollback:
             data: Iterable[List[Optional[ScreenCell]]] = itertools.chain(self.scroll_buffer, self.screen)
+            cursor_offset = len(self.scroll_buffer)
         else:
             data = self.screen
-        for y, r in enumerate(data):
+            cursor_offset = 0
+        if self.hide_cursor:
+            cursor: Optional[Tuple[int, int]] = None
+        else:
+            cursor = (self.col, self.row + cursor_offset)
+        # a cursor that is not over a character is drawn in the current foreground color
+        cursor_color = self.foreground & 0b1111
+        # Only the cells that changed since the last render of this screen (plus the old and new cursor positions)
+        # need to be redrawn, as long as nothing that affects every cell has changed in between
+        render_key = (
+            tuple(f.path for f in font), font.size, scaled_height, fill_color, self.bell, self.width, self.height
+        )
+        previous = self._last_render
+        if include_scrollback or previous is None or previous[0] != render_key:
+            im = Image.new("P", (image_width + 2 * font_width, image_height + 2 * font_height), fill_color)
+            previous_cells: Optional[List[List[Optional[ScreenCell]]]] = None
+            previous_cursor: Optional[Tuple[int, int]] = None
+        else:
+            _, previous_im, previous_cells, previous_cursor, previous_cursor_color = previous
+            if previous_cursor == cursor and previous_cursor_color == cursor_color and previous_cells == self.screen:
+                # nothing on the screen changed (the cells are compared by identity), so neither did the image
+                return previous_im
+            im = previous_im.copy()
+        # Each distinct (character, foreground, background) cell is rasterized once into a tile that is kept for as long
+        # as the font and cell size stay the same, so frames are assembled by pasting tiles rather than by issuing a
+        # rectangle and a text draw call for every cell
+        tiles_key = (render_key[0], font.size, scaled_height, font_width, font_height)
+        if self._tiles_key != tiles_key:
+            self._tiles_key = tiles_key
+            self._tiles = {}
+            self._glyphs = {}
+        tiles = self._tiles
+        # everything that is the same for every cell is looked up once, outside of the cell loop
+        rows = list(data)
+        row_width = max(map(len, rows), default=self.width)
+        xpix = [font_width * (x + 1) for x in range(row_width)]
+        ypix = [font_height * (y + 1) for y in range(len(rows))]
+        cursor_x, cursor_y = cursor if cursor is not None else (-1, -1)
+        previous_x, previous_y = previous_cursor if previous_cursor is not None else (-1, -1)
+        bell = self.bell
+        inverse = int(CGAAttribute.INVERSE)
+        # Image.paste re-checks both images and the box on every call, none of which can differ between cells here,
+        # so the tiles are pasted with the core image's paste instead
+        im.load()
+        paste = im.im.paste
+        cursor_drawn = False
+        for y, r in enumerate(rows):
+            if previous_cells is None or len(previous_cells[y]) != len(r):
+                previous_row: Optional[List[Optional[ScreenCell]]] = None
+            else:
+                previous_row = previous_cells[y]
+                # comparing the whole row at once (cells compare by identity) skips rows that did not change without
+                # visiting their cells one by one
+                if y != cursor_y and y != previous_y and previous_row == r:
+                    continue
+            top = ypix[y]
+            # the columns of the cursor and of the previous cursor in this row, or -1 if they are not in it
+            row_cursor_x = cursor_x if y == cursor_y else -1
+            row_previous_x = previous_x if y == previous_y else -1
+            # runs of adjacent blank cells that need clearing are filled with a single paste
+            blank_left = blank_right = 0
             for x, cell in enumerate(r):
-                if cell is not None:
-                    c, foreground, background, attr = cell.value, cell.foreground, cell.background, cell.attr
-                    if self.bell:
-                        foreground, background = background, foreground
-                    if int(CGAAttribute.INVERSE) & int(attr):
-                        foreground, background = background, foreground
-                    if not self.hide_cursor and self.row == y and self.col == x:
-                        foreground, background = background, foreground
-                        cursor_drawn = True
-                    pos = (font_width * (x + 1), font_height * (y + 1))
-                    draw.rectangle((pos, (pos[0] + font_width + 1, pos[1] + 1)), fill=to_rgb(background))
-                    draw.text((pos[0], pos[1]), c, fill=to_rgb(foreground), font=font.get_font(c))
-
-        if not self.hide_cursor and not cursor_drawn:
-            pos = (font_width * (self.col + 1) + 1, font_height * (self.row + 1) + 1)
-            draw.rectangle(
-                ((pos[0], pos[1] + font_height), (pos[0] + font_width, pos[1])),
-                fill=to_rgb(self.foreground)
-            )
-
-        if antialias:
-            im = im.resize((image_width // scale_factor, image_height // scale_factor), resample=Image.ANTIALIAS)
+                is_cursor = x == row_cursor_x
+                if previous_row is not None and cell is previous_row[x] and not is_cursor and x != row_previous_x:
+                    continue
+                left = xpix[x]
+                if cell is None:
+                    if previous_cells is not None:
+                        if left != blank_right:
+                            if blank_right > blank_left:
+                                paste(fill_color, (blank_left, top, blank_right, top + font_height))
+                            blank_left = left
+                        blank_right = left + font_width
+                    continue
+                # the bell, the inverse attribute and the cursor each swap the colors, so they cancel out in pairs
+                if bell ^ bool(cell.attr & inverse) ^ is_cursor:
+                    foreground, background = cell.background, cell.foreground
+                else:
+                    foreground, background = cell.foreground, cell.background
+                if is_cursor:
+                    cursor_drawn = True
+                c = cell.value
+                key = (c, foreground & 0b1111, background & 0b1111)
+                tile = tiles.get(key)
+                if tile is None:
+                    if len(tiles) >= MAX_CACHED_TILES:
+                        tiles.clear()
+                    tile = self._render_tile(
+                        c, foreground, background, font, (scaled_width, scaled_height), (font_width, font_height)
+                    )
+                    tiles[key] = tile
+                paste(tile.im, (left, top, left + font_width, top + font_height))
+            if blank_right > blank_left:
+                paste(fill_color, (blank_left, top, blank_right, top + font_height))
+
+        if previous_cursor is not None \
+                and not (0 <= previous_y < len(rows) and 0 <= previous_x < len(rows[previous_y])):
+            # a cursor that was moved off of the grid was drawn in the margin, which no cell covers
+            pos = (font_width * (previous_x + 1), font_height * (previous_y + 1))
+            im.paste(fill_color, (pos[0], pos[1], pos[0] + font_width, pos[1] + font_height))
+
+        if cursor is not None and not cursor_drawn:
+            pos = (font_width * (cursor[0] + 1), font_height * (cursor[1] + 1))
+            im.paste(cursor_color, (pos[0], pos[1], pos[0] + font_width, pos[1] + font_height))
+
+        self._palette.apply(im)
+
+        if not include_scrollback:
+            # the snapshot of the cells is updated in place rather than reallocated on every frame
+            if previous is not None and len(previous[2]) == len(self.screen):
+                cells = previous[2]
+            else:
+                cells = [[] for _ in self.screen]
+            for snapshot, row in zip(cells, self.screen):
+                snapshot[:] = row
+            self._last_render = (render_key, im, cells, cursor, cursor_color)
 
         return im
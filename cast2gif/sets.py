@@ -10,11 +10,11 @@ class OrderedMutableSet(Generic[T], MutableSet[T]):
         self._keys: Dict[T: None] = dict.fromkeys(items)
 
     def add(self, value: T) -> None:
-        if value not in self._keys:
-            self._keys[value] = None
+        # assigning a key that is already present keeps its original position
+        self._keys[value] = None
 
     def discard(self, value: T) -> None:
-        del self._keys[value]
+        self._keys.pop(value, None)
 
     def __contains__(self, x: object) -> bool:
         return x in self._keys
@@ -1,9 +1,32 @@
 from enum import IntEnum
-from typing import Optional, SupportsIndex, SupportsInt, Tuple, Union
+import re
+from typing import Callable, Dict, Optional, SupportsIndex, SupportsInt, Tuple, Union
 
 from cast2gif.screen import Screen, CGAColor, CGAAttribute
 
 
+# A run of characters that are each written to a single screen cell, with no control or escape characters in it
+TEXT_RUN = re.compile(r"[^\x00-\x1f\x7f]+")
+
+# Transmission control characters (DC3, DC4, NAK and SYN) that are dropped rather than written to the screen
+IGNORED_CHARS = frozenset("\x13\x14\x15\x16")
+
+
+# CGA color values of the eight ANSI X.364 colors, indexed by ANSI color
+ANSI_TO_CGA: Tuple[int, ...] = (0, 4, 2, 6, 1, 5, 3, 7)
+_ANSI_TO_CGA_COLORS: Tuple[CGAColor, ...] = tuple(CGAColor(color) for color in ANSI_TO_CGA)
+
+GRAY = int(CGAColor.GRAY)
+BLACK = int(CGAColor.BLACK)
+PLAIN = int(CGAAttribute.PLAIN)
+INTENSE = int(CGAAttribute.INTENSE)
+INVERSE = int(CGAAttribute.INVERSE)
+
+# Parsed SGR parameter lists, keyed by the raw parameter string, since recordings repeat the same few escapes
+MAX_CACHED_SGR_PARAMETERS = 1 << 10
+_SGR_PARAMETERS: Dict[str, Tuple[Optional[int], ...]] = {}
+
+
 def to_int(n: Union[str, bytes, SupportsInt, SupportsIndex], default: Optional[int] = None) -> Optional[int]:
     try:
         return int(n)
@@ -13,8 +36,7 @@ def to_int(n: Union[str, bytes, SupportsInt, SupportsIndex], default: Optional[i
 
 def ansi_to_cga(index: int) -> CGAColor:
     """Converts ANSI X.364 to CGA"""
-    index = index % 8
-    return CGAColor([0, 4, 2, 6, 1, 5, 3, 7][index])
+    return _ANSI_TO_CGA_COLORS[index % 8]
 
 
 class ANSITerminal(Screen):
@@ -34,26 +56,58 @@ class ANSITerminal(Screen):
 
     def write(self, char: Optional[str], foreground: Optional[CGAColor] = None, background: Optional[CGAColor] = None,
               attr: Optional[CGAAttribute] = None):
-        if char is None or len(char) == 0 or char in '\x13\x14\x15\x26':
-            pass
-        elif len(char) > 1:
-            for c in char:
-                self.write(c, foreground=foreground, background=background, attr=attr)
-        elif self._state == ANSITerminal.TerminalState.OUTSIDE:
-            if ord(char) == 27:
-                self._state = ANSITerminal.TerminalState.ESC
+        if char is None:
+            return
+        # Strings are consumed in a single loop rather than by recursing once per character, with the lookups that
+        # do not change between characters hoisted out of it
+        outside = ANSITerminal.TerminalState.OUTSIDE
+        escape = ANSITerminal.TerminalState.ESC
+        escape_bracket = ANSITerminal.TerminalState.ESCBKT
+        screen_write = super().write
+        match_text = TEXT_RUN.match
+        match_sequence = ESCAPE_SEQUENCE.match
+        ignored = IGNORED_CHARS
+        i = 0
+        while i < len(char):
+            state = self._state
+            if state == outside:
+                # runs of printable characters are written to the screen in bulk
+                run = match_text(char, i)
+                if run is not None:
+                    i = run.end()
+                    self.write_text(run.group(), foreground=foreground, background=background, attr=attr)
+                    self._last_char = char[i - 1]
+                    continue
+                # as are escape sequences that arrive whole, rather than stepping through them a character at a time
+                sequence = match_sequence(char, i)
+                if sequence is not None:
+                    i = sequence.end()
+                    final = sequence.group(2)
+                    if final is not None:
+                        self._esc = sequence.group(1)
+                        self._state = escape_bracket
+                        self._write_escbkt(final)
+                    self._last_char = char[i - 1]
+                    continue
+            c = char[i]
+            i += 1
+            if c in ignored:
+                pass
+            elif state == outside:
+                if c == '\x1b':
+                    self._state = escape
+                else:
+                    screen_write(c, foreground=foreground, background=background, attr=attr)
+            elif state == escape:
+                self._write_esc(c)
+            elif state == escape_bracket:
+                self._write_escbkt(c)
             else:
-                super().write(char, foreground=foreground, background=background, attr=attr)
-        elif self._state == ANSITerminal.TerminalState.ESC:
-            self._write_esc(char)
-        elif self._state == ANSITerminal.TerminalState.ESCBKT:
-            self._write_escbkt(char)
-        elif self._state == ANSITerminal.TerminalState.OSC:
-            # an Operating System Command is terminated by the BEL character
-            # or by ESC\
-            if char == '\x07' or char == '\\' and ord(self._last_char) == 27:
-                self._state = ANSITerminal.TerminalState.OUTSIDE
-        self._last_char = char
+                # an Operating System Command is terminated by the BEL character
+                # or by ESC\
+                if c == '\x07' or c == '\\' and self._last_char == '\x1b':
+                    self._state = outside
+            self._last_char = c
 
     def _write_esc(self, char: str):
         if char == ']':
@@ -67,98 +121,118 @@ class ANSITerminal(Screen):
             raise Exception(f"Escape sequence ESC \\x{ord(char):02x} is not currently supported!")
 
     def _write_escbkt(self, char: str):
-        esc_value = to_int(self._esc, 1)
-        matched = True
-        if char == 'A':
-            self.move_up(esc_value)
-        elif char in 'Be':
-            self.move_down(esc_value)
-        elif char in 'Ca':
-            self.move_right(esc_value)
-        elif char in 'D':
-            self.move_left(esc_value)
-        elif char in 'd`':
-            self.move_to(0, esc_value - 1)
-        elif char in 'E`':
-            self.move_down(esc_value)
-            self.write('\r')
-        elif char in 'F`':
-            self.move_up(esc_value)
-            self.write('\r')
-        elif char in 'G`':
-            self.move_to(esc_value - 1)
-        elif char == 'H':
-            esc_value = self._esc.split(';')
-            if len(esc_value) == 2:
-                row, col = esc_value
-            elif len(esc_value) == 1:
-                row, col = esc_value[0], None
-            else:
-                row, col = None, None
-            self.move_to(to_int(col, 1) - 1, to_int(row, 1) - 1)
-        elif char == 'J':
-            esc_value = to_int(self._esc, 0)
-            self.clear(esc_value)
-            if esc_value == 2:
-                self.move_to(0, 0)
-        elif char == 'K':
-            esc_value = to_int(self._esc, 0)
-            self.erase_line(esc_value)
-        elif char == 'h':
-            if self._esc == '?2004':
-                # we don't need to handle bracketed paste mode
-                pass
-            else:
-                raise NotImplementedError("ESC[%sh escape is currently unsupported!" % self._esc)
-        elif char == 'l':
-            if self._esc == '?2004':
-                # we don't need to handle bracketed paste mode
-                pass
-            else:
-                raise NotImplementedError("ESC[%sl escape is currently unsupported!" % self._esc)
-        elif char == 'm':
-            self._write_esc_m()
-        elif char == 's':
-            self._stored_pos = (self.col, self.row)
-        elif char == 'u':
-            if self._stored_pos is not None:
-                self.move_to(*self._stored_pos)
-        elif char in 'STfinhl':
-            raise NotImplementedError(f"ESC[{self._esc}{char} escape is currently unsupported!")
-        else:
-            matched = False
-        if matched:
+        handler = ANSITerminal._CSI_HANDLERS.get(char)
+        if handler is not None:
+            handler(self)
             self._state = ANSITerminal.TerminalState.OUTSIDE
+        elif char in 'STfin':
+            raise NotImplementedError(f"ESC[{self._esc}{char} escape is currently unsupported!")
         self._esc += char
 
+    def _csi_next_line(self):
+        self.move_down(to_int(self._esc, 1))
+        self.col = 0
+
+    def _csi_previous_line(self):
+        self.move_up(to_int(self._esc, 1))
+        self.col = 0
+
+    def _csi_move_to(self):
+        esc_value = self._esc.split(';')
+        if len(esc_value) == 2:
+            row, col = esc_value
+        elif len(esc_value) == 1:
+            row, col = esc_value[0], None
+        else:
+            row, col = None, None
+        self.move_to(to_int(col, 1) - 1, to_int(row, 1) - 1)
+
+    def _csi_clear(self):
+        esc_value = to_int(self._esc, 0)
+        self.clear(esc_value)
+        if esc_value == 2:
+            self.move_to(0, 0)
+
+    def _csi_set_mode(self):
+        # we don't need to handle bracketed paste mode
+        if self._esc != '?2004':
+            raise NotImplementedError("ESC[%sh escape is currently unsupported!" % self._esc)
+
+    def _csi_reset_mode(self):
+        # we don't need to handle bracketed paste mode
+        if self._esc != '?2004':
+            raise NotImplementedError("ESC[%sl escape is currently unsupported!" % self._esc)
+
+    def _csi_store_position(self):
+        self._stored_pos = (self.col, self.row)
+
+    def _csi_restore_position(self):
+        if self._stored_pos is not None:
+            self.move_to(*self._stored_pos)
+
+    # The handler for each final character of a Control Sequence Introducer (ESC[) sequence; the sequence is still
+    # being read until one of these characters arrives
+    _CSI_HANDLERS: Dict[str, Callable[["ANSITerminal"], None]] = {
+        'A': lambda self: self.move_up(to_int(self._esc, 1)),
+        'B': lambda self: self.move_down(to_int(self._esc, 1)),
+        'e': lambda self: self.move_down(to_int(self._esc, 1)),
+        'C': lambda self: self.move_right(to_int(self._esc, 1)),
+        'a': lambda self: self.move_right(to_int(self._esc, 1)),
+        'D': lambda self: self.move_left(to_int(self._esc, 1)),
+        'd': lambda self: self.move_to(0, to_int(self._esc, 1) - 1),
+        '`': lambda self: self.move_to(0, to_int(self._esc, 1) - 1),
+        'E': _csi_next_line,
+        'F': _csi_previous_line,
+        'G': lambda self: self.move_to(to_int(self._esc, 1) - 1),
+        'H': _csi_move_to,
+        'J': _csi_clear,
+        'K': lambda self: self.erase_line(to_int(self._esc, 0)),
+        'h': _csi_set_mode,
+        'l': _csi_reset_mode,
+        'm': lambda self: self._write_esc_m(),
+        's': _csi_store_position,
+        'u': _csi_restore_position,
+    }
+
     def _write_esc_m(self):
-        for esc in map(to_int, self._esc.split(';')):
+        foreground, background, attr = self.foreground, self.background, self.attr
+        parameters = _SGR_PARAMETERS.get(self._esc)
+        if parameters is None:
+            if len(_SGR_PARAMETERS) >= MAX_CACHED_SGR_PARAMETERS:
+                _SGR_PARAMETERS.clear()
+            parameters = _SGR_PARAMETERS[self._esc] = tuple(map(to_int, self._esc.split(';')))
+        for esc in parameters:
             if esc is None:
                 continue
             elif esc == 0:
-                self.foreground = CGAColor.GRAY
-                self.background = CGAColor.BLACK
-                self.attr = CGAAttribute.PLAIN
+                foreground, background, attr = GRAY, BLACK, PLAIN
             elif esc == 1:
-                self.foreground |= CGAAttribute.INTENSE
-            elif esc in [2, 21, 22]:
-                self.foreground |= ~CGAAttribute.INTENSE
+                foreground |= INTENSE
+            elif esc == 2 or esc == 21 or esc == 22:
+                foreground &= ~INTENSE
             elif esc == 5:
-                self.background |= CGAAttribute.INTENSE
+                background |= INTENSE
             elif esc == 7:
-                self.attr |= CGAAttribute.INVERSE
+                attr |= INVERSE
             elif esc == 25:
-                self.background &= ~CGAAttribute.INTENSE
+                background &= ~INTENSE
             elif esc == 27:
-                self.attr &= ~CGAAttribute.INVERSE
-            elif esc in range(30, 38):
-                self.foreground = (self.foreground & CGAAttribute.INTENSE) | ansi_to_cga(esc - 30)
-            elif esc in range(40, 48):
-                self.background = (self.background & CGAAttribute.INTENSE) | ansi_to_cga(esc - 40)
-            elif esc in range(90, 98):
-                self.foreground = ansi_to_cga(esc - 82)
-            elif esc in range(100, 108):
-                self.foreground = ansi_to_cga(esc - 92)
+                attr &= ~INVERSE
+            elif 30 <= esc <= 37:
+                foreground = (foreground & INTENSE) | ANSI_TO_CGA[esc - 30]
+            elif 40 <= esc <= 47:
+                background = (background & INTENSE) | ANSI_TO_CGA[esc - 40]
+            elif 90 <= esc <= 97:
+                foreground = ANSI_TO_CGA[esc - 90] | INTENSE
+            elif 100 <= esc <= 107:
+                background = ANSI_TO_CGA[esc - 100] | INTENSE
+        self.foreground, self.background, self.attr = foreground, background, attr
+
+
+# A complete CSI sequence with plain numeric parameters, or a complete Operating System Command
+ESCAPE_SEQUENCE = re.compile(
+    r"\x1b\[([0-9;?]*)([" + re.escape("".join(ANSITerminal._CSI_HANDLERS)) + r"])|\x1b\][^\x07\x1b]*(?:\x07|\x1b\\)"
+)
 
 
 class NullScreen:
@@ -168,9 +242,15 @@ class NullScreen:
     def __setitem__(self, key, value):
         pass
 
+    def __delitem__(self, key):
+        pass
+
     def __add__(self, other):
         return NullScreen()
 
+    def append(self, value):
+        pass
+
 
 class InfiniteWidthTerminal(ANSITerminal):
     def __init__(self):
@@ -0,0 +1,55 @@
+from pathlib import Path
+import random
+import unittest
+
+from cast2gif.fonts import FontCollection
+from cast2gif.terminal import ANSITerminal
+
+
+FONT_PATH = Path(__file__).absolute().parent.parent / "cast2gif" / "fonts" / "SourceCodePro" / "SourceCodePro-Regular.ttf"
+
+WIDTH = 12
+HEIGHT = 5
+
+
+class TestIncrementalRender(unittest.TestCase):
+    def setUp(self):
+        self.font = FontCollection(FONT_PATH, size=12)
+
+    def random_output(self, rng: random.Random) -> str:
+        """Returns a random chunk of terminal output, favoring the escapes that move the cursor or change colors"""
+        pieces = [
+            "a", "b", "xyz", "é", " ", "\r", "\n", "\t", "\b", "\x7f", "\x07",
+            "\x1b[0m", "\x1b[1m", "\x1b[7m", "\x1b[27m", "\x1b[31m", "\x1b[44m", "\x1b[92m", "\x1b[105m",
+            "\x1b[K", "\x1b[1K", "\x1b[2K", "\x1b[J", "\x1b[1J", "\x1b[2J",
+            "\x1b[A", "\x1b[B", "\x1b[C", "\x1b[D", "\x1b[s", "\x1b[u", "\x1b[G",
+            f"\x1b[{rng.randint(0, HEIGHT + 1)};{rng.randint(0, WIDTH + 1)}H",
+            f"\x1b[{rng.randint(0, WIDTH + 1)}G",
+            f"\x1b[{rng.randint(0, HEIGHT + 1)}d",
+        ]
+        return "".join(rng.choice(pieces) for _ in range(rng.randint(1, 6)))
+
+    def test_incremental_render_matches_full_render(self):
+        for seed in range(20):
+            rng = random.Random(seed)
+            term = ANSITerminal(WIDTH, HEIGHT)
+            for step in range(60):
+                try:
+                    term.write(self.random_output(rng))
+                except IndexError:
+                    # editing a row that the cursor was moved below the screen is not supported, but the screen is
+                    # still in a state that can be rendered
+                    pass
+                incremental = term.render(self.font)
+                last_render = term._last_render
+                term._last_render = None
+                full = term.render(self.font)
+                term._last_render = last_render
+                # both renders use the screen's palette, so their indices can be compared directly
+                self.assertEqual(
+                    incremental.tobytes(), full.tobytes(), f"incremental render differs at seed {seed}, step {step}"
+                )
+
+
+if __name__ == "__main__":
+    unittest.main()